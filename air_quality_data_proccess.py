@@ -1,41 +1,73 @@
+import asyncio
 import requests
-import json
+import requests_cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import httpx
+import orjson
 from datetime import datetime
+from urllib.parse import urlencode
 
 API_BASE_URL = "https://api.ibb.gov.tr/havakalitesi/OpenDataPortalHandler/"
 
+# İstek URL'sinin loglanması isteniyorsa True yapın. URL istasyon ID'si ve
+# tarih aralığı içerdiği için varsayılan olarak yazdırılmaz.
+VERBOSE = False
+
+# Tüm istekler için ortak bir Session kullan: keep-alive sayesinde her çağrıda
+# yeniden TCP+TLS el sıkışması yapılmaz, urllib3 bağlantı havuzu tekrar kullanılır.
+# CachedSession aynı URL+parametre ile yapılan istekleri 1 saat boyunca yerel
+# sqlite dosyasından cevaplar; süre dolunca veya cache'te yoksa ağa düşer.
+SESSION = requests_cache.CachedSession(
+    'aqi_cache',
+    expire_after=3600,
+    allowable_methods=('GET',),
+)
+SESSION.headers['Accept-Encoding'] = 'gzip'
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504]),
+))
+
 def get_stations():
     """Hava kalitesi ölçüm istasyonlarının listesini İBB API'sinden alır."""
     url = API_BASE_URL + "GetAQIStations"
     print(f"İstasyon listesi şu adresten alınıyor: {url}")
     try:
-        response = requests.get(url, timeout=10) # 10 saniye timeout
+        # İstasyon listesi nadiren değiştiği için 24 saat cache'te tutulur.
+        response = SESSION.get(url, timeout=10, expire_after=86400) # 10 saniye timeout
         response.raise_for_status()  # HTTP hataları için (4xx veya 5xx) exception fırlatır
-        return response.json()
+        # orjson stdlib json'dan kat kat hızlı parse eder; ham bayt içeriği doğrudan verilir.
+        return orjson.loads(response.content)
     except requests.exceptions.Timeout:
         print("İstek zaman aşımına uğradı. Lütfen internet bağlantınızı kontrol edin veya daha sonra tekrar deneyin.")
         return None
     except requests.exceptions.RequestException as e:
         print(f"İstasyonlar getirilirken bir hata oluştu: {e}")
         return None
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
         print("API'den gelen istasyon verisi JSON formatında değil. Yanıt:")
         print(response.text if 'response' in locals() else "Yanıt alınamadı.")
         return None
 
-def display_stations(stations):
-    """İstasyon listesini kullanıcıya gösterir."""
+def build_station_index(stations):
+    """İstasyon listesinden Id -> istasyon sözlüğü kurar (ID'siz kayıtlar atlanır)."""
     if not stations:
+        return {}
+    return {station['Id']: station for station in stations if station.get('Id')}
+
+def display_stations(station_index):
+    """İstasyon listesini kullanıcıya gösterir."""
+    if not station_index:
         print("Görüntülenecek istasyon bulunamadı.")
         return False # İstasyon bulunamadığını belirtmek için False döndür
     print("\n Mevcut Hava Kalitesi İstasyonları ")
     print("------------------------------------")
-    for station in stations:
+    for station_id, station in station_index.items():
         # Bazı istasyon adları None olabilir, bunları kontrol edelim
         station_name = station.get('Name', 'İsim Yok')
-        station_id = station.get('Id')
-        if station_id: # Sadece ID'si olanları gösterelim
-             print(f"ID: {station_id} - İsim: {station_name}")
+        print(f"ID: {station_id} - İsim: {station_name}")
     print("------------------------------------")
     return True # İstasyonlar başarıyla gösterildi
 
@@ -50,12 +82,14 @@ def get_air_quality_data(station_id, start_date_str, end_date_str):
     }
     
     print(f"\n{station_id} ID'li istasyon için '{start_date_str}' ile '{end_date_str}' tarihleri arasında veri alınıyor...")
-    print(f"İstek atılan URL (parametreler ile): {requests.Request('GET', url, params=params).prepare().url}")
+    if VERBOSE:
+        # Salt log için Request/PreparedRequest kurmak gereksiz; urlencode yeterli.
+        print(f"İstek atılan URL (parametreler ile): {url}?{urlencode(params)}")
 
     try:
-        response = requests.get(url, params=params, timeout=30) # Veri sorgusu için daha uzun timeout
+        response = SESSION.get(url, params=params, timeout=30) # Veri sorgusu için daha uzun timeout
         response.raise_for_status()
-        return response.json()
+        return orjson.loads(response.content)
     except requests.exceptions.Timeout:
         print("Veri isteği zaman aşımına uğradı. Lütfen internet bağlantınızı kontrol edin veya daha sonra tekrar deneyin.")
         return None
@@ -64,34 +98,61 @@ def get_air_quality_data(station_id, start_date_str, end_date_str):
         if response is not None:
             print(f"Sunucu Hatası Detayı: {response.status_code} - {response.text}")
         return None
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
         print("API'den gelen hava kalitesi verisi JSON formatında değil. Yanıt:")
         print(response.text if 'response' in locals() else "Yanıt alınamadı.")
         return None
 
-def is_valid_station_id(station_id, stations):
-    """Verilen station_id'nin geçerli (listede var olan) bir ID olup olmadığını kontrol eder."""
-    if not stations:
-        return False
-    for station in stations:
-        if station.get('Id') == station_id:
-            return True
-    return False
+async def fetch_aqi(client, station_id, start_date_str, end_date_str):
+    """Tek bir istasyonun hava kalitesi verisini asenkron olarak alır."""
+    params = {
+        'StationId': station_id,
+        'StartDate': start_date_str,
+        'EndDate': end_date_str
+    }
+    response = await client.get(API_BASE_URL + "GetAQIByStationId", params=params)
+    response.raise_for_status()
+    return orjson.loads(response.content)
+
+async def fetch_all(station_ids, start_date_str, end_date_str):
+    """Birden fazla istasyonun verisini tek bir AsyncClient üzerinden eşzamanlı alır.
+
+    Sıralı çağrıda K istasyon K*RTT beklerken, burada tüm istekler aynı anda
+    uçar ve toplam süre yaklaşık tek bir isteğin süresine iner.
+    Döndürülen sözlükte hata alan istasyonlar None olarak işaretlenir.
+    """
+    limits = httpx.Limits(max_connections=16)
+    async with httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(30.0)) as client:
+        tasks = [fetch_aqi(client, sid, start_date_str, end_date_str) for sid in station_ids]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    data_by_station = {}
+    for sid, result in zip(station_ids, results):
+        if isinstance(result, Exception):
+            print(f"{sid} ID'li istasyonun verisi alınamadı: {result}")
+            data_by_station[sid] = None
+        else:
+            data_by_station[sid] = result
+    return data_by_station
+
+def get_air_quality_data_bulk(station_ids, start_date_str, end_date_str):
+    """fetch_all için senkron sarmalayıcı; CLI tarafından kullanılabilir."""
+    return asyncio.run(fetch_all(station_ids, start_date_str, end_date_str))
 
 def main():
     """Ana uygulama fonksiyonu."""
     stations = get_stations()
-    
-    if not stations or not display_stations(stations):
+    station_index = build_station_index(stations)
+
+    if not station_index or not display_stations(station_index):
         print("Program sonlandırılıyor.")
         return
 
-    while True:
-        station_id = input("Lütfen hava kalitesi verilerini almak istediğiniz istasyonun ID'sini girin: ").strip()
-        if is_valid_station_id(station_id, stations):
-            break
-        else:
-            print("Geçersiz istasyon ID'si. Lütfen yukarıdaki listeden geçerli bir ID girin.")
+    # Geçerli ID kontrolü sözlük üzerinde O(1) üyelik sorgusudur; ayrıca bir
+    # doğrulama fonksiyonu çağırmaya gerek yok.
+    prompt = "Lütfen hava kalitesi verilerini almak istediğiniz istasyonun ID'sini girin: "
+    while (station_id := input(prompt).strip()) not in station_index:
+        print("Geçersiz istasyon ID'si. Lütfen yukarıdaki listeden geçerli bir ID girin.")
 
     print("\nLütfen başlangıç ve bitiş tarihlerini 'gg.AA.yyyy SS:dd:ss' formatında girin.")
     date_format = "%d.%m.%Y %H:%M:%S"
@@ -123,7 +184,8 @@ def main():
         print("\n Alınan Hava Kalitesi Verileri ")
         print("----------------------------------")
         # JSON verisini daha okunaklı bir şekilde yazdır
-        print(json.dumps(air_quality_data, indent=4, ensure_ascii=False))
+        # orjson doğrudan UTF-8 üretir; Türkçe karakterler için ensure_ascii gerekmez.
+        print(orjson.dumps(air_quality_data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode())
         
         # Örnek: Veri bir liste ise içindeki bazı önemli alanları yazdırma
         # if isinstance(air_quality_data, list) and air_quality_data:
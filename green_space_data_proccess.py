@@ -1,11 +1,26 @@
+import os
+
 import geopandas as gpd
 
 # Dosya adını belirtin
 file_path = 'green_space.txt' # Yüklediğiniz dosyanın adı
 
 # 1. GeoJSON dosyasını GeoDataFrame olarak yükle
+# pyogrio motoru dosyayı Arrow tabanlı sütunlar halinde C seviyesinde okur;
+# fiona'nın özellik başına Python nesnesi kurmasına göre kat kat daha hızlıdır.
+# Sadece belirli sütunlar gerekiyorsa columns=['MAHALLE'] ile diğerleri hiç okunmaz.
+# İlk okuyuşta dosyanın yanına GeoParquet kopyası yazılır; sonraki çalıştırmalar
+# GeoJSON parse maliyetini tamamen atlar (cache kaynaktan eskiyse yenilenir).
+parquet_cache = file_path + '.parquet'
 try:
-    gdf = gpd.read_file(file_path)
+    if os.path.exists(parquet_cache) and os.path.getmtime(parquet_cache) >= os.path.getmtime(file_path):
+        gdf = gpd.read_parquet(parquet_cache)
+    else:
+        gdf = gpd.read_file(file_path, engine='pyogrio', use_arrow=True)
+        try:
+            gdf.to_parquet(parquet_cache)
+        except Exception as e:
+            print(f"Parquet cache yazılamadı ({parquet_cache}): {e}")
 except Exception as e:
     print(f"Dosya okunurken bir hata oluştu: {e}")
     exit()
@@ -58,22 +73,27 @@ elif gdf.crs.to_string() != "EPSG:4326" and not gdf.crs.is_projected:
 # İstanbul için UTM Zone 35N (EPSG:32635) veya Türkiye için uygun bir projeksiyon (EPSG:5255 - TUREF TM 30)
 # Daha genel bir yaklaşım olarak, verinin merkezine göre bir UTM zonu seçilebilir.
 # Ancak, İstanbul için EPSG:32635 yaygın bir seçimdir.
+# Not: Alan hesabı için tüm DataFrame'i değil, yalnızca geometri sütununu
+# projeksiyona çevirmek yeterlidir; öznitelik sütunlarının kopyalanması ve
+# ikinci bir GeoDataFrame kurulması böylece tamamen atlanır.
 try:
-    gdf_projected = gdf.to_crs(epsg=32635) # İstanbul için UTM Zone 35N
+    # .to_numpy() ile ham float64 dizisini al: her iki sütun da aynı diziden
+    # türetilir, pandas dtype çıkarımı ve ikinci bir Series tahsisi yapılmaz.
+    areas_m2 = gdf.geometry.to_crs(epsg=32635).area.to_numpy() # İstanbul için UTM Zone 35N
 except Exception as e:
     print(f"CRS dönüştürme sırasında hata: {e}")
     print("Lütfen verinizin geçerli bir coğrafi CRS'ye sahip olduğundan emin olun.")
     exit()
 
 # 4. Her mahallenin alanını hesaplama (metrekare cinsinden)
-gdf_projected['alan_metrekare'] = gdf_projected.geometry.area
+gdf['alan_metrekare'] = areas_m2
 
-# Alanı kilometrekareye çevirme
-gdf_projected['alan_kilometrekare'] = gdf_projected['alan_metrekare'] / 1_000_000
+# Alanı kilometrekareye çevirme (tek SIMD geçişinde çarpma)
+gdf['alan_kilometrekare'] = areas_m2 * 1e-6
 
 # 5. Sonuçları gösterme
 print(f"\nMahalleler ve Yüzölçümleri ({neighborhood_column} sütununa göre):")
-results = gdf_projected[[neighborhood_column, 'alan_metrekare', 'alan_kilometrekare']]
+results = gdf[[neighborhood_column, 'alan_metrekare', 'alan_kilometrekare']]
 
 # Eğer aynı mahalle adı birden fazla geometriye sahipse (multi-part features),
 # ve bunları birleştirmek isterseniz, groupby kullanabilirsiniz.
